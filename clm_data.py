@@ -4,13 +4,138 @@ CLM Data Manager - Simplified version
 """
 
 import pandas as pd
+import numpy as np
 import json
 import os
+import re
+import time
 from datetime import datetime
 import hashlib
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import chain
 from typing import Dict, List, Any
 
+# Faster JSON (de)serialization when available
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Instruction/format rows embedded in the exported trade sheets
+_FORMAT_RE = re.compile(r'Data format|How to get')
+
+# Every CSV column read by parse_positions_df/create_position_ids; others are skipped on load
+_POSITION_COLUMNS = frozenset([
+    'Position Details', 'Position', 'Token Pair', 'Strategy', 'Status',
+    'Platform', 'Protocol', 'Chain', 'Blockchain', 'Wallet', 'Address',
+    'Total Entry Value', 'Entry Value (cash in)', 'Entry Date', 'Date', 'Days #',
+    'Min Range', 'Max Range', 'Exit Date', 'Exit Value',
+    'Claimed Yield Value', 'Claimed Yield Return', 'Price Return', 'IL',
+    'Transaction Fees', 'Slippage', 'Yield APR', 'Net Return'
+])
+
+# Free-text columns, read as strings so pandas skips type inference for them
+_TEXT_COLUMNS = ('Position Details', 'Position', 'Token Pair', 'Strategy', 'Status',
+                 'Platform', 'Protocol', 'Chain', 'Blockchain', 'Wallet', 'Address')
+# Columns hashed into position ids; read as strings so every chunk of a large file
+# yields the same id text (inference could give '1000' in one chunk and '1000.0' in another)
+_ID_COLUMNS = ('Entry Date', 'Total Entry Value', 'Entry Value (cash in)')
+_POSITION_DTYPES = {col: str for col in _TEXT_COLUMNS + _ID_COLUMNS}
+
+# Candidate CSV columns for each position field, in priority order
+_COLUMN_MAP = {
+    'position': ['Position Details', 'Position', 'Token Pair'],
+    'platform': ['Platform', 'Protocol'],
+    'chain': ['Chain', 'Blockchain'],
+    'entry_value': ['Total Entry Value', 'Entry Value (cash in)'],
+    'entry_date': ['Entry Date', 'Date'],
+    'wallet': ['Wallet', 'Address']
+}
+
+# Numeric columns read directly by parse_positions_df, parsed a whole column at a time
+_CURRENCY_COLUMNS = ('Min Range', 'Max Range', 'Exit Value', 'Claimed Yield Value')
+_PERCENTAGE_COLUMNS = ('Claimed Yield Return', 'Price Return', 'IL', 'Transaction Fees',
+                       'Slippage', 'Yield APR', 'Net Return')
+_CURRENCY_CHARS_RE = re.compile(r'[$,"\']')
+_PERCENTAGE_CHARS_RE = re.compile(r'[%"\']')
+
+# Rows per read_csv chunk, bounding memory on very large position exports
+_CSV_CHUNK_ROWS = 50_000
+
+# Seconds a saved price snapshot is reused before the APIs are queried again
+_PRICE_CACHE_TTL = 120
+
+# Wrapped tokens priced through their base asset
+_BTC_WRAPS = frozenset(['WBTC', 'CBBTC'])
+_ETH_WRAPS = frozenset(['WETH', 'WHETH'])
+
+# SOL-quoted pairs priced as a ratio: pair -> token whose USD price is divided by SOL's
+_SOL_RATIO_PAIRS = {
+    'JLP/SOL': 'JLP',
+    'WBTC/SOL': 'BTC',
+    'CBBTC/SOL': 'BTC',
+    'WHETH/SOL': 'ETH'
+}
+
+# Token symbol -> DefiLlama coin id
+_DEFILLAMA_IDS = {
+    'SOL': 'coingecko:solana',
+    'ORCA': 'coingecko:orca',
+    'RAY': 'coingecko:raydium',
+    'JLP': 'solana:27G8MtK7VtTcCHkpASjSDdkWWYfoqT6ggEuKidVJidD4',
+    'USDC': 'coingecko:usd-coin',
+    'ETH': 'coingecko:ethereum',
+    'BTC': 'coingecko:bitcoin',
+    'SUI': 'coingecko:sui',
+    'WETH': 'coingecko:ethereum',
+    'WBTC': 'coingecko:wrapped-bitcoin',
+    'CBBTC': 'coingecko:coinbase-wrapped-btc',
+    'WHETH': 'coingecko:ethereum',
+    'USDT': 'coingecko:tether'
+}
+
+# Token symbol -> CoinGecko coin id
+_COINGECKO_IDS = {
+    'SOL': 'solana',
+    'USDC': 'usd-coin',
+    'ETH': 'ethereum',
+    'BTC': 'bitcoin',
+    'SUI': 'sui',
+    'ORCA': 'orca',
+    'RAY': 'raydium',
+    'JLP': 'jupiter-exchange-solana',
+    'WETH': 'ethereum',
+    'USDT': 'tether'
+}
+
+@lru_cache(maxsize=256)
+def _normalize_token_pair(pair):
+    """Normalize token pair format for consistent pricing (pure, so memoized)"""
+    if not pair:
+        return pair
+        
+    pair = pair.strip()
+    
+    # Handle perpetual positions (show as token/USDC for pricing)
+    if 'short' in pair.lower():
+        token = pair.replace('short', '').strip().upper()
+        return f"{token}/USDC"
+    
+    # Handle CLM positions with "TOKEN + USD" format
+    if '+' in pair and 'USD' in pair.upper():
+        token = pair.split('+')[0].strip().upper()
+        return f"{token}/USDC"
+    
+    # Handle standard "TOKEN/TOKEN" format (keep as-is)
+    if '/' in pair:
+        return pair
+        
+    return pair
+
 class CLMDataManager:
     def __init__(self):
         self.long_positions = []
@@ -20,195 +145,215 @@ class CLMDataManager:
         self.price_changes = {}
         self.fx_rates = {}
         
+        # Last response per API URL, revalidated with ETag/Last-Modified on the next refresh
+        self._http_cache = {}
+        
+        # Keep-alive sessions for the price APIs; the FX fetch runs on a worker thread, so it gets its own
+        self._http = self._new_session()
+        self._fx_http = self._new_session()
+        
         # File paths
         self.long_json = "data/JSON_out/clm_long.json"
         self.neutral_json = "data/JSON_out/clm_neutral.json"
         self.closed_json = "data/JSON_out/clm_closed.json"
         self.transactions_json = "data/JSON_out/clm_transactions.json"
+        self.price_cache_json = "data/JSON_out/price_cache.json"
         
-    def parse_value(self, value, value_type='currency'):
-        """Universal value parser"""
-        if pd.isna(value) or value == '' or value == 'N/A':
-            return None
+    def parse_value_series(self, series: pd.Series, value_type='currency') -> pd.Series:
+        """Parse a currency/percentage column to floats (unparseable cells become NaN)"""
+        if pd.api.types.is_numeric_dtype(series):
+            return series.astype(float)
         
-        if isinstance(value, str):
-            if value_type == 'currency':
-                value = value.replace('$', '').replace(',', '').strip()
-            elif value_type == 'percentage':
-                value = value.replace('%', '').strip()
-            
-            # Remove any quotes that might be in the value
-            value = value.replace('"', '').replace("'", '')
-            
-            try:
-                return float(value)
-            except ValueError:
-                return None
-        
-        return float(value)
-    
-    def get_column_value(self, row, field_type):
-        """Get value from row using simple column mapping"""
-        column_map = {
-            'position': ['Position Details', 'Position', 'Token Pair'],
-            'platform': ['Platform', 'Protocol'],
-            'chain': ['Chain', 'Blockchain'],
-            'entry_value': ['Total Entry Value', 'Entry Value (cash in)'],
-            'entry_date': ['Entry Date', 'Date'],
-            'wallet': ['Wallet', 'Address']
-        }
-        
-        for col_name in column_map.get(field_type, []):
-            if col_name in row.index and pd.notna(row[col_name]):
-                return row[col_name]
-        return None
+        chars_re = _CURRENCY_CHARS_RE if value_type == 'currency' else _PERCENTAGE_CHARS_RE
+        cleaned = series.astype('string').str.replace(chars_re, '', regex=True).str.strip()
+        return pd.to_numeric(cleaned, errors='coerce').astype(float)
+    
+    def parse_value_columns(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Convert the currency/percentage columns of a position CSV to floats in bulk"""
+        df = df.copy()
+        for col in _CURRENCY_COLUMNS:
+            if col in df.columns:
+                df[col] = self.parse_value_series(df[col], 'currency')
+        for col in _PERCENTAGE_COLUMNS:
+            if col in df.columns:
+                df[col] = self.parse_value_series(df[col], 'percentage')
+        return df
+    
+    def resolve_columns(self, columns) -> Dict[str, List[str]]:
+        """Resolve, once per CSV, which mapped columns exist for each field type"""
+        return {field_type: [col_name for col_name in candidates if col_name in columns]
+                for field_type, candidates in _COLUMN_MAP.items()}
     
     def clean_csv_data(self, df):
         """Remove format/instruction rows from CSV"""
         position_col = 'Position Details' if 'Position Details' in df.columns else 'Position'
         
         if position_col in df.columns:
-            df = df[~df[position_col].str.contains('Data format|How to get', na=False)]
-            df = df.dropna(subset=[position_col])
-            df = df[df[position_col].str.strip() != '']
+            col = df[position_col]
+            mask = (col.notna() &
+                    ~col.str.contains(_FORMAT_RE, na=False) &
+                    (col.str.strip() != ''))
+            df = df[mask]
         
         return df
     
-    def _normalize_token_pair(self, pair):
-        """Normalize token pair format for consistent pricing"""
-        if not pair:
-            return pair
-            
-        pair = pair.strip()
+    def _row_strategies(self, df: pd.DataFrame, strategy: str) -> pd.Series:
+        """Per-row strategy: the Strategy column overrides the default where present"""
+        strategies = pd.Series(strategy, index=df.index, dtype=object)
+        if 'Strategy' in df.columns:
+            override = df['Strategy'].notna()
+            strategies[override] = df.loc[override, 'Strategy'].map(str).str.lower().str.strip()
+        return strategies
+    
+    def create_position_ids(self, df: pd.DataFrame, strategy: str) -> pd.Series:
+        """Create unique IDs for every row of a position CSV in one pass"""
+        def column_str(col_name):
+            if col_name in df.columns:
+                return df[col_name].map(str)
+            return pd.Series('', index=df.index, dtype=object)
+        
+        strategies = self._row_strategies(df, strategy)
+        position_col = 'Position Details' if 'Position Details' in df.columns else 'Position'
+        entry_value = column_str('Total Entry Value').where(strategies == 'long',
+                                                            column_str('Entry Value (cash in)'))
         
-        # Handle perpetual positions (show as token/USDC for pricing)
-        if 'short' in pair.lower():
-            token = pair.replace('short', '').strip().upper()
-            return f"{token}/USDC"
+        id_strings = (column_str(position_col) + '_' + column_str('Entry Date') + '_' +
+                      entry_value + '_' + strategies)
+        return id_strings.map(lambda s: hashlib.blake2b(s.encode(), digest_size=6).hexdigest())
+    
+    def parse_positions_df(self, df: pd.DataFrame, strategy: str, now_iso: str = None) -> List[dict]:
+        """Parse every row of a cleaned position CSV into standardized format, column by column"""
+        if df.empty:
+            return []
         
-        # Handle CLM positions with "TOKEN + USD" format
-        if '+' in pair and 'USD' in pair.upper():
-            token = pair.split('+')[0].strip().upper()
-            return f"{token}/USDC"
+        df = self.parse_value_columns(df)
+        resolved_columns = self.resolve_columns(df.columns)
         
-        # Handle standard "TOKEN/TOKEN" format (keep as-is)
-        if '/' in pair:
-            return pair
-            
-        return pair
-    
-    def create_position_id(self, row: pd.Series, strategy: str) -> str:
-        """Create unique ID for position"""
-        position_col = 'Position Details' if 'Position Details' in row.index else 'Position'
-        position_details = str(row.get(position_col, ''))
-        entry_date = str(row.get('Entry Date', ''))
-        entry_value_col = 'Total Entry Value' if strategy == 'long' else 'Entry Value (cash in)'
-        entry_value = str(row.get(entry_value_col, ''))
-        
-        id_string = f"{position_details}_{entry_date}_{entry_value}_{strategy}"
-        return hashlib.md5(id_string.encode()).hexdigest()[:12]
-    
-    def parse_position(self, row: pd.Series, strategy: str) -> dict:
-        """Parse a single position row into standardized format"""
-        # Get position details
-        position_details = self.get_column_value(row, 'position')
-        if not position_details:
-            position_details = str(next(iter([v for v in row.values if pd.notna(v)]), 'Unknown'))
-        else:
-            position_details = str(position_details)
+        def column(col_name):
+            if col_name in df.columns:
+                return df[col_name]
+            return pd.Series(np.nan, index=df.index)
         
-        # Extract token pair from position details
-        if '|' in position_details:
-            _, pair = position_details.split('|', 1)
-            pair = pair.strip()
-        else:
-            pair = position_details
+        def mapped_value(field_type):
+            # First non-null value among the mapped columns, None if all are missing
+            values = pd.Series(None, index=df.index, dtype=object)
+            for col_name in reversed(resolved_columns[field_type]):
+                values = df[col_name].astype(object).where(df[col_name].notna(), values)
+            return values
         
-        # Get basic fields
-        platform = str(self.get_column_value(row, 'platform') or 'Unknown')
+        def is_falsy(values):
+            return values.isna() | values.isin(['', 0])
         
-        # Override strategy if specified in row
-        if 'Strategy' in row.index and pd.notna(row['Strategy']):
-            strategy = str(row['Strategy']).lower().strip()
+        def mapped_str(field_type, default):
+            values = mapped_value(field_type)
+            return values.where(~is_falsy(values), default).map(str)
         
-        # Normalize token pair format for pricing
-        pair = self._normalize_token_pair(pair)
+        # Position details ('Unknown' when no position column has a value; only
+        # _POSITION_COLUMNS are loaded, so other cells of the row are not available)
+        position_details = mapped_str('position', 'Unknown')
         
-        # Get entry value
-        entry_value = None
-        entry_value_raw = self.get_column_value(row, 'entry_value')
-        if entry_value_raw:
-            entry_value = self.parse_value(entry_value_raw, 'currency')
+        # Extract token pair from position details and normalize it for pricing
+        has_pipe = position_details.str.contains('|', regex=False)
+        pairs = position_details.where(~has_pipe,
+                                       position_details.str.partition('|')[2].str.strip())
+        pairs = pairs.map(_normalize_token_pair)
+        
+        # Entry columns are read as strings, so a zero entry arrives as '0' rather than a
+        # falsy number; it still means no entry value
+        entry_value_raw = mapped_value('entry_value')
+        no_entry = is_falsy(entry_value_raw) | (pd.to_numeric(entry_value_raw, errors='coerce') == 0)
+        entry_values = self.parse_value_series(entry_value_raw.where(~no_entry), 'currency')
         
         # Check if position is closed
-        status = str(row.get('Status', '')).lower().strip()
-        exit_date = row.get('Exit Date')
-        is_closed = (status in ['closed', 'close', 'exit', 'exited'] or 
-                    (pd.notna(exit_date) and str(exit_date).strip() != ''))
-        
-        # Create position object
-        position = {
-            'id': self.create_position_id(row, strategy),
+        if 'Status' in df.columns:
+            statuses = df['Status'].map(str).str.lower().str.strip()
+        else:
+            statuses = pd.Series('', index=df.index, dtype=object)
+        exit_dates = column('Exit Date')
+        exit_strs = exit_dates.map(str)
+        has_exit = exit_dates.notna() & (exit_strs.str.strip() != '')
+        is_closed = statuses.isin(['closed', 'close', 'exit', 'exited']) | has_exit
+        
+        positions = pd.DataFrame({
+            'id': self.create_position_ids(df, strategy),
             'position_details': position_details,
-            'strategy': strategy,
-            'platform': platform,
-            'token_pair': pair,
-            'chain': str(self.get_column_value(row, 'chain') or 'Unknown'),
-            'wallet': str(self.get_column_value(row, 'wallet') or 'Unknown'),
-            'entry_value': entry_value,
-            'entry_date': str(self.get_column_value(row, 'entry_date') or ''),
-            'days_active': float(row.get('Days #')) if pd.notna(row.get('Days #')) else None,
-            'min_range': self.parse_value(row.get('Min Range'), 'currency'),
-            'max_range': self.parse_value(row.get('Max Range'), 'currency'),
-            'exit_date': str(exit_date) if pd.notna(exit_date) and str(exit_date).strip() != '' else None,
-            'exit_value': self.parse_value(row.get('Exit Value'), 'currency'),
-            'claimed_yield_value': self.parse_value(row.get('Claimed Yield Value'), 'currency'),
-            'claimed_yield_return': self.parse_value(row.get('Claimed Yield Return'), 'percentage'),
-            'price_return': self.parse_value(row.get('Price Return'), 'percentage'),
-            'impermanent_loss': self.parse_value(row.get('IL'), 'percentage'),
-            'transaction_fees': self.parse_value(row.get('Transaction Fees'), 'percentage'),
-            'slippage': self.parse_value(row.get('Slippage'), 'percentage'),
-            'yield_apr': self.parse_value(row.get('Yield APR'), 'percentage'),
-            'net_return': self.parse_value(row.get('Net Return'), 'percentage'),
-            'status': status if status else ('closed' if is_closed else 'open'),
-            'is_active': not is_closed,
+            'strategy': self._row_strategies(df, strategy),
+            'platform': mapped_str('platform', 'Unknown'),
+            'token_pair': pairs,
+            'chain': mapped_str('chain', 'Unknown'),
+            'wallet': mapped_str('wallet', 'Unknown'),
+            'entry_value': entry_values,
+            'entry_date': mapped_str('entry_date', ''),
+            'days_active': pd.to_numeric(column('Days #'), errors='coerce').astype(float),
+            'min_range': column('Min Range'),
+            'max_range': column('Max Range'),
+            'exit_date': exit_strs.where(has_exit, None),
+            'exit_value': column('Exit Value'),
+            'claimed_yield_value': column('Claimed Yield Value'),
+            'claimed_yield_return': column('Claimed Yield Return'),
+            'price_return': column('Price Return'),
+            'impermanent_loss': column('IL'),
+            'transaction_fees': column('Transaction Fees'),
+            'slippage': column('Slippage'),
+            'yield_apr': column('Yield APR'),
+            'net_return': column('Net Return'),
+            'status': statuses.where(statuses != '', np.where(is_closed, 'closed', 'open')),
+            'is_active': ~is_closed,
             'current_price': None,
             'range_status': 'unknown',
-            'last_updated': datetime.now().isoformat()
-        }
+            'last_updated': now_iso or datetime.now().isoformat()
+        }, index=df.index)
         
-        return position
+        # Missing values become None, as in the saved JSON
+        positions = positions.astype(object).where(positions.notna(), None)
+        return positions.to_dict('records')
+    
+    def _write_json(self, path, data):
+        """Write JSON atomically: dump to a temp file, then rename over the target"""
+        tmp_path = f"{path}.tmp"
+        if orjson is not None:
+            with open(tmp_path, 'wb') as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY |
+                                     orjson.OPT_NON_STR_KEYS))
+        else:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    
+    def _read_json(self, path):
+        """Read a JSON file (raises FileNotFoundError if missing)"""
+        with open(path, 'rb') as f:
+            raw = f.read()
+        
+        if orjson is not None:
+            try:
+                return orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                pass  # Exported data may contain NaN, which only the stdlib parser accepts
+        return json.loads(raw)
     
     def save_positions(self):
         """Save positions to separate JSON files"""
         os.makedirs(os.path.dirname(self.long_json), exist_ok=True)
         
-        with open(self.long_json, 'w') as f:
-            json.dump(self.long_positions, f, indent=2)
-        
-        with open(self.neutral_json, 'w') as f:
-            json.dump(self.neutral_positions, f, indent=2)
-            
-        with open(self.closed_json, 'w') as f:
-            json.dump(self.closed_positions, f, indent=2)
+        self._write_json(self.long_json, self.long_positions)
+        self._write_json(self.neutral_json, self.neutral_positions)
+        self._write_json(self.closed_json, self.closed_positions)
     
     def load_existing_positions(self):
         """Load existing position data"""
         try:
-            with open(self.long_json, 'r') as f:
-                self.long_positions = json.load(f)
+            self.long_positions = self._read_json(self.long_json)
         except FileNotFoundError:
             self.long_positions = []
             
         try:
-            with open(self.neutral_json, 'r') as f:
-                self.neutral_positions = json.load(f)
+            self.neutral_positions = self._read_json(self.neutral_json)
         except FileNotFoundError:
             self.neutral_positions = []
             
         try:
-            with open(self.closed_json, 'r') as f:
-                self.closed_positions = json.load(f)
+            self.closed_positions = self._read_json(self.closed_json)
         except FileNotFoundError:
             self.closed_positions = []
     
@@ -221,16 +366,24 @@ class CLMDataManager:
             return True
         return False
     
+    def iter_csv_positions(self, csv_path: str, strategy: str, now_iso: str = None):
+        """Yield parsed positions from a position CSV, reading it in bounded chunks"""
+        now_iso = now_iso or datetime.now().isoformat()
+        with pd.read_csv(csv_path, usecols=lambda c: c in _POSITION_COLUMNS,
+                         dtype=_POSITION_DTYPES, chunksize=_CSV_CHUNK_ROWS) as reader:
+            for chunk in reader:
+                yield from self.parse_positions_df(self.clean_csv_data(chunk), strategy, now_iso)
+    
     def load_from_csv(self, neutral_csv: str, long_csv: str):
         """Load positions from CSV files"""
         import pandas as pd
         
+        # All rows of one load share the same timestamp
+        now_iso = datetime.now().isoformat()
+        
         # Load neutral positions
         if os.path.exists(neutral_csv):
-            neutral_df = pd.read_csv(neutral_csv)
-            neutral_df = self.clean_csv_data(neutral_df)
-            for _, row in neutral_df.iterrows():
-                position = self.parse_position(row, 'neutral')
+            for position in self.iter_csv_positions(neutral_csv, 'neutral', now_iso):
                 if position['is_active']:
                     self.neutral_positions.append(position)
                 else:
@@ -238,10 +391,7 @@ class CLMDataManager:
         
         # Load long positions
         if os.path.exists(long_csv):
-            long_df = pd.read_csv(long_csv)
-            long_df = self.clean_csv_data(long_df)
-            for _, row in long_df.iterrows():
-                position = self.parse_position(row, 'long')
+            for position in self.iter_csv_positions(long_csv, 'long', now_iso):
                 if position['is_active']:
                     self.long_positions.append(position)
                 else:
@@ -269,23 +419,27 @@ class CLMDataManager:
         self.closed_positions = []
         
         try:
-            df = pd.read_csv(csv_path)
-            df = self.clean_csv_data(df)
-            
-            for _, row in df.iterrows():
-                # Parse position - strategy will be determined from the Strategy column
-                position = self.parse_position(row, 'unknown')
-                
+            # Parse positions - strategy will be determined from the Strategy column
+            unknown_strategy = []
+            for position in self.iter_csv_positions(csv_path, 'unknown'):
                 if position['is_active']:
                     if position['strategy'] == 'long':
                         self.long_positions.append(position)
                     elif position['strategy'] == 'neutral':
                         self.neutral_positions.append(position)
                     else:
-                        print(f"⚠️  Unknown strategy '{position['strategy']}' for position: {position['position_details']}")
+                        unknown_strategy.append(position)
                 else:
                     self.closed_positions.append(position)
             
+            # Report skipped rows in one write instead of one print per row
+            if unknown_strategy:
+                warnings = [f"⚠️  Unknown strategy '{p['strategy']}' for position: {p['position_details']}"
+                            for p in unknown_strategy[:20]]
+                if len(unknown_strategy) > 20:
+                    warnings.append(f"⚠️  ... and {len(unknown_strategy) - 20} more positions with unknown strategy")
+                print('\n'.join(warnings))
+            
             # Save to JSON
             self.save_positions()
             
@@ -299,44 +453,29 @@ class CLMDataManager:
     def load_transactions(self) -> list:
         """Load transaction data from JSON"""
         try:
-            with open(self.transactions_json, 'r') as f:
-                return json.load(f)
+            return self._read_json(self.transactions_json)
         except FileNotFoundError:
             return []
     
     def save_transactions(self, transactions: list):
         """Save transaction data to JSON"""
         os.makedirs(os.path.dirname(self.transactions_json), exist_ok=True)
-        with open(self.transactions_json, 'w') as f:
-            json.dump(transactions, f, indent=2)
-    
-    def get_token_prices(self):
-        """Fetch current prices for tokens using DefiLlama + CoinGecko"""
-        tokens = set()
-        all_positions = self.long_positions + self.neutral_positions
-        
-        for position in all_positions:
-            if position['token_pair']:
-                pair = position['token_pair'].replace(' ', '')
-                if '/' in pair:
-                    token_a, token_b = pair.split('/')
-                    tokens.add(token_a.upper())
-                    tokens.add(token_b.upper())
+        self._write_json(self.transactions_json, transactions)
+    
+    def get_token_prices(self, force: bool = False):
+        """Fetch current prices for tokens using DefiLlama + CoinGecko (force skips the price cache)"""
+        pairs = {p['token_pair'].replace(' ', '') for p in self.iter_active_positions() if p['token_pair']}
+        tokens = {token.upper() for pair in pairs if '/' in pair for token in pair.split('/')}
         
         # Add base tokens for wrapped tokens
-        if any(token in ['WBTC', 'CBBTC'] for token in tokens):
+        if tokens & _BTC_WRAPS:
             tokens.add('BTC')
-        if any(token in ['WETH', 'WHETH'] for token in tokens):
+        if tokens & _ETH_WRAPS:
             tokens.add('ETH')
         
-        # Try DefiLlama first
-        self._fetch_defillama_prices(tokens)
-        
-        # Fill gaps with CoinGecko
-        self._fetch_coingecko_prices(tokens)
-        
-        # Fetch FX rates
-        self._fetch_fx_rates()
+        # Reuse a recent snapshot when it already prices every token
+        if force or not self._load_price_cache(tokens):
+            self._fetch_prices(tokens)
         
         # Demo prices if all APIs fail
         if not self.prices:
@@ -369,44 +508,131 @@ class CLMDataManager:
                 'CAD_USD': 0.70
             }
             print("🔄 Using demo FX rates (API unavailable)")
+    
+    def _fetch_prices(self, tokens):
+        """Fetch token prices and FX rates from the APIs, caching only what they returned"""
+        # Start from empty dicts so earlier refreshes (including demo fallbacks) never reach the cache
+        previous = (self.prices, self.price_changes, self.fx_rates)
+        self.prices, self.price_changes, self.fx_rates = {}, {}, {}
+        
+        # FX rates don't depend on token prices, so fetch them alongside
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            fx_future = executor.submit(self._fetch_fx_rates)
+            
+            # Try DefiLlama first
+            self._fetch_defillama_prices(tokens)
+            
+            # Fill gaps with CoinGecko (skipped when DefiLlama covered every token)
+            missing_tokens = tokens - self.prices.keys()
+            if missing_tokens:
+                self._fetch_coingecko_prices(missing_tokens)
+            
+            total_fetched = len(self.prices)
+            if total_fetched > 0:
+                print(f"📈 Total prices fetched: {total_fetched} tokens")
+            
+            # Printed only after the price output so the two threads never interleave
+            fx_message = fx_future.result()
+            if fx_message:
+                print(fx_message)
+        
+        if self.prices:
+            self._save_price_cache()
+        
+        # Keep earlier values for anything this refresh did not return
+        self.prices = {**previous[0], **self.prices}
+        self.price_changes = {**previous[1], **self.price_changes}
+        self.fx_rates = {**previous[2], **self.fx_rates}
         
         # Store timestamp for display
         self.last_price_update = datetime.now()
     
+    def _load_price_cache(self, tokens) -> bool:
+        """Restore prices and FX rates saved less than _PRICE_CACHE_TTL seconds ago"""
+        try:
+            saved_at = os.path.getmtime(self.price_cache_json)
+            if time.time() - saved_at >= _PRICE_CACHE_TTL:
+                return False
+            cache = self._read_json(self.price_cache_json)
+            prices = dict(cache['prices'])
+            price_changes = dict(cache['price_changes'])
+            fx_rates = dict(cache['fx_rates'])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            # Missing, stale-format or hand-edited cache: fall through to a normal fetch
+            return False
+        
+        if not tokens <= prices.keys():
+            return False
+        
+        self.prices.update(prices)
+        self.price_changes.update(price_changes)
+        self.fx_rates.update(fx_rates)
+        self.last_price_update = datetime.fromtimestamp(saved_at)
+        print(f"💾 Using cached prices ({len(self.prices)} tokens, {int(time.time() - saved_at)}s old)")
+        return True
+    
+    def _save_price_cache(self):
+        """Persist the latest prices and FX rates for reuse by the next refresh"""
+        try:
+            os.makedirs(os.path.dirname(self.price_cache_json), exist_ok=True)
+            self._write_json(self.price_cache_json, {
+                'prices': self.prices,
+                'price_changes': self.price_changes,
+                'fx_rates': self.fx_rates
+            })
+        except OSError as e:
+            print(f"⚠️  Could not save price cache: {e}")
+    
+    def _new_session(self):
+        """HTTP session retrying 5xx responses briefly (Retry-After is ignored so a refresh never stalls)"""
+        session = requests.Session()
+        # Retry only transient 5xx answers; a timed-out endpoint fails once instead of hanging again
+        retries = Retry(total=None, connect=0, read=0, status=2, backoff_factor=0.5,
+                        status_forcelist=(500, 502, 503, 504), respect_retry_after_header=False)
+        session.mount('https://', HTTPAdapter(max_retries=retries))
+        return session
+    
+    def _get_json(self, url, session=None):
+        """GET a JSON API response, reusing the cached body when the server answers 304"""
+        headers = {}
+        cached = self._http_cache.get(url)
+        if cached:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+        
+        response = (session or self._http).get(url, headers=headers, timeout=10)
+        
+        if response.status_code == 304 and cached:
+            return cached['data']
+        
+        if response.status_code == 200:
+            data = response.json()
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if etag or last_modified:
+                self._http_cache[url] = {'etag': etag, 'last_modified': last_modified, 'data': data}
+            return data
+        
+        return None
+    
     def _fetch_defillama_prices(self, tokens):
         """Fetch prices from DefiLlama API"""
-        defillama_map = {
-            'SOL': 'coingecko:solana',
-            'ORCA': 'coingecko:orca', 
-            'RAY': 'coingecko:raydium',
-            'JLP': 'solana:27G8MtK7VtTcCHkpASjSDdkWWYfoqT6ggEuKidVJidD4',
-            'USDC': 'coingecko:usd-coin',
-            'ETH': 'coingecko:ethereum',
-            'BTC': 'coingecko:bitcoin',
-            'SUI': 'coingecko:sui',
-            'WETH': 'coingecko:ethereum',
-            'WBTC': 'coingecko:wrapped-bitcoin',
-            'CBBTC': 'coingecko:coinbase-wrapped-btc',
-            'WHETH': 'coingecko:ethereum',
-            'USDT': 'coingecko:tether'
-        }
-        
         try:
-            available_tokens = [token for token in tokens if token in defillama_map]
+            available_tokens = [token for token in tokens if token in _DEFILLAMA_IDS]
             if not available_tokens:
                 return
                 
-            coin_ids = ','.join([defillama_map[token] for token in available_tokens])
+            coin_ids = ','.join([_DEFILLAMA_IDS[token] for token in available_tokens])
             
             url = f"https://coins.llama.fi/prices/current/{coin_ids}"
-            response = requests.get(url, timeout=10)
+            price_data = self._get_json(url)
             
-            if response.status_code == 200:
-                price_data = response.json()
-                
+            if price_data is not None:
                 if 'coins' in price_data:
                     for token in available_tokens:
-                        coin_id = defillama_map[token]
+                        coin_id = _DEFILLAMA_IDS[token]
                         if coin_id in price_data['coins']:
                             coin_data = price_data['coins'][coin_id]
                             if 'price' in coin_data:
@@ -421,34 +647,19 @@ class CLMDataManager:
     
     def _fetch_coingecko_prices(self, tokens):
         """Fetch prices from CoinGecko API for missing tokens"""
-        coingecko_map = {
-            'SOL': 'solana',
-            'USDC': 'usd-coin',
-            'ETH': 'ethereum',
-            'BTC': 'bitcoin',
-            'SUI': 'sui',
-            'ORCA': 'orca',
-            'RAY': 'raydium',
-            'JLP': 'jupiter-exchange-solana',
-            'WETH': 'ethereum',
-            'USDT': 'tether'
-        }
-        
         try:
-            missing_tokens = [token for token in tokens if token not in self.prices and token in coingecko_map]
+            missing_tokens = [token for token in tokens if token not in self.prices and token in _COINGECKO_IDS]
             if not missing_tokens:
                 return
                 
-            coingecko_ids = ','.join([coingecko_map[token] for token in missing_tokens])
+            coingecko_ids = ','.join([_COINGECKO_IDS[token] for token in missing_tokens])
             
             url = f"https://api.coingecko.com/api/v3/simple/price?ids={coingecko_ids}&vs_currencies=usd&include_24hr_change=true"
-            response = requests.get(url, timeout=10)
+            price_data = self._get_json(url)
             
-            if response.status_code == 200:
-                price_data = response.json()
-                
+            if price_data is not None:
                 for token in missing_tokens:
-                    gecko_id = coingecko_map[token]
+                    gecko_id = _COINGECKO_IDS[token]
                     if gecko_id in price_data:
                         self.prices[token] = price_data[gecko_id]['usd']
                         if 'usd_24h_change' in price_data[gecko_id]:
@@ -460,103 +671,97 @@ class CLMDataManager:
                     
         except Exception as e:
             print(f"⚠️  CoinGecko API error: {e}")
-        
-        total_fetched = len(self.prices)
-        if total_fetched > 0:
-            print(f"📈 Total prices fetched: {total_fetched} tokens")
     
     def _fetch_fx_rates(self):
-        """Fetch FX rates from exchangerate-api.io"""
+        """Fetch FX rates from exchangerate-api.io (returns the status line for the caller to print)"""
         try:
             url = "https://open.er-api.com/v6/latest/USD"
-            response = requests.get(url, timeout=10)
+            fx_data = self._get_json(url, self._fx_http)
             
-            if response.status_code == 200:
-                fx_data = response.json()
-                
+            if fx_data is not None:
                 if fx_data.get('result') == 'success' and 'rates' in fx_data:
                     usd_cad = fx_data['rates'].get('CAD')
                     if usd_cad:
                         self.fx_rates['USD_CAD'] = usd_cad
                         self.fx_rates['CAD_USD'] = 1.0 / usd_cad
-                        print(f"💱 FX rates: 1 USD = ${usd_cad:.4f} CAD")
+                        return f"💱 FX rates: 1 USD = ${usd_cad:.4f} CAD"
                         
         except Exception as e:
-            print(f"⚠️  FX API error: {e}")
+            return f"⚠️  FX API error: {e}"
+        
+        return None
     
     def update_position_status(self):
         """Update current price and range status for positions"""
-        all_positions = self.long_positions + self.neutral_positions
-        
-        for position in all_positions:
+        # Prices are fixed for the duration of a refresh, so resolve each distinct pair once
+        pair_prices = {}
+        priced_positions = []
+        current_prices = []
+        for position in self.iter_active_positions():
             if not position['token_pair']:
                 continue
                 
             pair = position['token_pair'].replace(' ', '')
             if '/' in pair:
-                current_price = self._calculate_pair_price(pair)
+                if pair not in pair_prices:
+                    pair_prices[pair] = self._calculate_pair_price(pair)
+                current_price = pair_prices[pair]
                 
                 if current_price is not None:
-                    position['current_price'] = current_price
-                    
-                    # Handle different position types
-                    if not position['min_range'] and position['max_range']:
-                        # Perpetual position
-                        if current_price > position['max_range']:
-                            position['range_status'] = 'perp_closed'
-                        else:
-                            position['range_status'] = 'perp_active'
-                    elif not position['min_range'] or not position['max_range']:
-                        # Position without valid ranges
-                        position['range_status'] = 'no_range'
-                    else:
-                        # Normal CLM position
-                        if current_price < position['min_range']:
-                            position['range_status'] = 'out_of_range_low'
-                        elif current_price > position['max_range']:
-                            position['range_status'] = 'out_of_range_high'
-                        else:
-                            position['range_status'] = 'in_range'
+                    priced_positions.append(position)
+                    current_prices.append(current_price)
+        
+        if not priced_positions:
+            return
+        
+        # Classify all positions in one vectorized pass (missing or zero ranges -> NaN)
+        prices = np.array(current_prices, dtype=float)
+        min_range = np.array([p['min_range'] or np.nan for p in priced_positions], dtype=float)
+        max_range = np.array([p['max_range'] or np.nan for p in priced_positions], dtype=float)
+        no_min = np.isnan(min_range)
+        no_max = np.isnan(max_range)
+        
+        range_statuses = np.select(
+            [
+                no_min & ~no_max & (prices > max_range),  # Perpetual position
+                no_min & ~no_max,
+                no_min | no_max,                          # Position without valid ranges
+                prices < min_range,                       # Normal CLM position
+                prices > max_range,
+            ],
+            ['perp_closed', 'perp_active', 'no_range', 'out_of_range_low', 'out_of_range_high'],
+            default='in_range'
+        )
+        
+        for position, current_price, range_status in zip(priced_positions, current_prices, range_statuses):
+            position['current_price'] = current_price
+            position['range_status'] = str(range_status)
     
     def _calculate_pair_price(self, pair):
         """Calculate the appropriate price for a token pair"""
         if not pair:
             return None
+        
+        pair = pair.upper()
             
         # Handle single tokens (for perpetuals)
         if '/' not in pair:
-            token = pair.upper()
-            return self.prices.get(token)
+            return self.prices.get(pair)
         
         tokens = pair.split('/')
         if len(tokens) != 2:
             return None
             
-        base_token = tokens[0].upper()
-        quote_token = tokens[1].upper()
+        base_token, quote_token = tokens
         
         # Special handling for specific pairs
-        if pair.upper() == 'JLP/SOL':
-            jlp_price = self.prices.get('JLP')
+        ratio_token = _SOL_RATIO_PAIRS.get(pair)
+        if ratio_token:
+            token_price = self.prices.get(ratio_token)
             sol_price = self.prices.get('SOL')
             
-            if jlp_price and sol_price and sol_price > 0:
-                return jlp_price / sol_price
-        
-        elif pair.upper() in ['WBTC/SOL', 'CBBTC/SOL', 'WHETH/SOL']:
-            btc_tokens = ['WBTC', 'CBBTC']
-            eth_tokens = ['WHETH', 'WHETF']
-            
-            if base_token in btc_tokens:
-                btc_price = self.prices.get('BTC')
-                sol_price = self.prices.get('SOL')
-                if btc_price and sol_price and sol_price > 0:
-                    return btc_price / sol_price
-            elif base_token in eth_tokens:
-                eth_price = self.prices.get('ETH')
-                sol_price = self.prices.get('SOL')
-                if eth_price and sol_price and sol_price > 0:
-                    return eth_price / sol_price
+            if token_price and sol_price and sol_price > 0:
+                return token_price / sol_price
         
         # Default behavior: use base token price directly
         if base_token in self.prices:
@@ -564,14 +769,18 @@ class CLMDataManager:
             
         return None
     
-    def refresh_prices_and_status(self):
+    def refresh_prices_and_status(self, force: bool = False):
         """Convenience method to refresh all price data"""
-        self.get_token_prices()
+        self.get_token_prices(force)
         self.update_position_status()
     
+    def iter_active_positions(self):
+        """Iterate over all active positions without building a combined list"""
+        return chain(self.long_positions, self.neutral_positions)
+    
     def get_all_active_positions(self):
         """Get all active positions combined"""
-        return self.long_positions + self.neutral_positions
+        return list(self.iter_active_positions())
     
     def get_positions_by_strategy(self, strategy: str):
         """Get positions by strategy type"""
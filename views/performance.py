@@ -171,7 +171,7 @@ class PerformanceView:
         """Get all unique tokens from portfolio"""
         tokens = set()
         
-        for position in self.data_manager.get_all_active_positions():
+        for position in self.data_manager.iter_active_positions():
             if position.get('token_pair'):
                 pair = position['token_pair'].replace(' ', '')
                 if '/' in pair:
@@ -503,19 +503,22 @@ class TransactionsView:
         # Chain and platform quick stats
         print(f"\n⛓️  CHAIN DISTRIBUTION")
         print("-" * 60)
-        chain_counts = valid_df['chain'].value_counts()
-        for chain, count in chain_counts.head(10).items():
-            percentage = (count / len(valid_df)) * 100
-            gas_total = valid_df[valid_df['chain'] == chain]['gas_fees'].fillna(0).sum()
-            print(f"{chain:<12} {count:>8,} txns ({percentage:>5.1f}%) | Gas: ${gas_total:.6f}")
+        gas_fees = valid_df['gas_fees'].fillna(0)
+        chain_counts = valid_df['chain'].value_counts().head(10)
+        chain_gas = gas_fees.groupby(valid_df['chain']).sum()
+        print('\n'.join(
+            f"{chain:<12} {count:>8,} txns ({(count / len(valid_df)) * 100:>5.1f}%) | Gas: ${chain_gas[chain]:.6f}"
+            for chain, count in chain_counts.items()
+        ))
         
         print(f"\n🏪 TOP PLATFORMS")
         print("-" * 60)
-        platform_counts = valid_df['platform'].value_counts()
-        for platform, count in platform_counts.head(10).items():
-            percentage = (count / len(valid_df)) * 100
-            gas_total = valid_df[valid_df['platform'] == platform]['gas_fees'].fillna(0).sum()
-            print(f"{platform[:11]:<12} {count:>8,} txns ({percentage:>5.1f}%) | Gas: ${gas_total:.6f}")
+        platform_counts = valid_df['platform'].value_counts().head(10)
+        platform_gas = gas_fees.groupby(valid_df['platform']).sum()
+        print('\n'.join(
+            f"{platform[:11]:<12} {count:>8,} txns ({(count / len(valid_df)) * 100:>5.1f}%) | Gas: ${platform_gas[platform]:.6f}"
+            for platform, count in platform_counts.items()
+        ))
         
         print(f"\n💡 Bank Statement View shows all {total_txns:,} transactions in chronological order")
         print(f"📈 Most recent transaction: {valid_df.iloc[0]['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}")